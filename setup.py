@@ -0,0 +1,21 @@
+"""
+Build hook for the optional Cython execution kernel (stackvm/_vm.pyx).
+
+The extension is optional: if Cython or a C compiler is unavailable the
+package installs without it and the VM uses the Numba kernel or the
+pure-Python interpreter instead.
+"""
+
+from setuptools import Extension, setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        [Extension("stackvm._vm", ["stackvm/_vm.pyx"], optional=True)],
+        language_level=3,
+    )
+
+setup(ext_modules=ext_modules)
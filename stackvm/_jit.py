@@ -0,0 +1,266 @@
+"""
+Numba-compiled execution kernel for the stack-based VM.
+
+The kernel runs lowered bytecode (parallel int arrays of opcode values and
+operands) directly on the VM's int64 stack and memory. Anything it cannot
+handle natively -- I/O, errors, a full stack or an int64 overflow -- makes
+it return EXIT_STEP with the machine state in ``state`` so the Python
+interpreter can execute that one instruction with its usual semantics.
+
+Numba is optional; ``run`` is None when it is not installed.
+"""
+
+from .opcodes import OpCode
+from ._status import EXIT_HALT, EXIT_STEP, EXIT_YIELD, BUDGET
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:  # Numba is an optional dependency
+    njit = None
+
+# Opcode values as module constants so Numba folds them into the kernel
+PUSH = OpCode.PUSH.value
+POP = OpCode.POP.value
+DUP = OpCode.DUP.value
+SWAP = OpCode.SWAP.value
+ADD = OpCode.ADD.value
+SUB = OpCode.SUB.value
+MUL = OpCode.MUL.value
+DIV = OpCode.DIV.value
+EQ = OpCode.EQ.value
+NEQ = OpCode.NEQ.value
+LT = OpCode.LT.value
+GT = OpCode.GT.value
+JMP = OpCode.JMP.value
+JZ = OpCode.JZ.value
+JNZ = OpCode.JNZ.value
+CALL = OpCode.CALL.value
+RET = OpCode.RET.value
+HALT = OpCode.HALT.value
+LOAD = OpCode.LOAD.value
+STORE = OpCode.STORE.value
+AND = OpCode.AND.value
+OR = OpCode.OR.value
+NOT = OpCode.NOT.value
+PUSH_ADD = OpCode.PUSH_ADD.value
+LOAD_PUSH_ADD_STORE = OpCode.LOAD_PUSH_ADD_STORE.value
+DUP_JZ = OpCode.DUP_JZ.value
+PUSH_I = OpCode.PUSH_I.value
+
+INT64_MIN = -(1 << 63)
+
+
+def _run(ops, args, stack, memory, call_stack, state):
+    """
+    Execute lowered bytecode until HALT or an instruction that needs the interpreter.
+
+    Args:
+        ops: Opcode value of each instruction (int32)
+        args: Operand of each instruction, 0 if it has none (int64)
+        stack: The VM stack (int64)
+        memory: The VM memory (int64)
+        call_stack: Return addresses (int32)
+        state: [pc, sp, csp], read on entry and written on exit
+
+    Returns:
+        EXIT_HALT, EXIT_STEP, or EXIT_YIELD after BUDGET instructions
+    """
+    pc = state[0]
+    sp = state[1]
+    csp = state[2]
+    stack_size = len(stack)
+    memory_size = len(memory)
+    status = EXIT_STEP
+    budget = BUDGET
+
+    while True:
+        budget -= 1
+        if budget < 0:
+            status = EXIT_YIELD
+            break
+        op = ops[pc]
+
+        if op == PUSH or op == PUSH_I:
+            if sp >= stack_size:
+                break
+            stack[sp] = args[pc]
+            sp += 1
+            pc += 1
+        elif op == LOAD:
+            a = args[pc]
+            if sp >= stack_size or a < 0 or a >= memory_size:
+                break
+            stack[sp] = memory[a]
+            sp += 1
+            pc += 1
+        elif op == STORE:
+            a = args[pc]
+            if sp < 1 or a < 0 or a >= memory_size:
+                break
+            sp -= 1
+            memory[a] = stack[sp]
+            pc += 1
+        elif op == JMP:
+            pc = args[pc]
+        elif op == JZ:
+            if sp < 1:
+                break
+            pc = args[pc] if stack[sp - 1] == 0 else pc + 1
+        elif op == JNZ:
+            if sp < 1:
+                break
+            pc = args[pc] if stack[sp - 1] != 0 else pc + 1
+        elif op == ADD or op == PUSH_ADD:
+            if op == ADD:
+                if sp < 2:
+                    break
+                a = stack[sp - 2]
+                b = stack[sp - 1]
+            else:
+                if sp < 1:
+                    break
+                a = stack[sp - 1]
+                b = args[pc]
+            r = a + b
+            if ((a ^ r) & (b ^ r)) < 0:
+                break  # int64 overflow
+            if op == ADD:
+                sp -= 1
+            stack[sp - 1] = r
+            pc += 1
+        elif op == SUB:
+            if sp < 2:
+                break
+            a = stack[sp - 2]
+            b = stack[sp - 1]
+            r = a - b
+            if ((a ^ b) & (a ^ r)) < 0:
+                break  # int64 overflow
+            stack[sp - 2] = r
+            sp -= 1
+            pc += 1
+        elif op == MUL:
+            if sp < 2:
+                break
+            a = stack[sp - 2]
+            b = stack[sp - 1]
+            # Multiply as uint64 so the product wraps; a signed multiply may
+            # be assumed not to overflow, which folds the check below away
+            r = np.int64(np.uint64(a) * np.uint64(b))
+            if (a == -1 and b == INT64_MIN) or (a != 0 and r // a != b):
+                break  # int64 overflow
+            stack[sp - 2] = r
+            sp -= 1
+            pc += 1
+        elif op == DIV:
+            if sp < 2:
+                break
+            a = stack[sp - 2]
+            b = stack[sp - 1]
+            if b == 0 or (a == INT64_MIN and b == -1):
+                break
+            stack[sp - 2] = a // b
+            sp -= 1
+            pc += 1
+        elif op == EQ or op == NEQ or op == LT or op == GT or op == AND or op == OR:
+            if sp < 2:
+                break
+            a = stack[sp - 2]
+            b = stack[sp - 1]
+            if op == EQ:
+                r = 1 if a == b else 0
+            elif op == NEQ:
+                r = 1 if a != b else 0
+            elif op == LT:
+                r = 1 if a < b else 0
+            elif op == GT:
+                r = 1 if a > b else 0
+            elif op == AND:
+                r = 1 if a != 0 and b != 0 else 0
+            else:
+                r = 1 if a != 0 or b != 0 else 0
+            stack[sp - 2] = r
+            sp -= 1
+            pc += 1
+        elif op == NOT:
+            if sp < 1:
+                break
+            stack[sp - 1] = 1 if stack[sp - 1] == 0 else 0
+            pc += 1
+        elif op == POP:
+            if sp < 1:
+                break
+            sp -= 1
+            pc += 1
+        elif op == DUP:
+            if sp < 1 or sp >= stack_size:
+                break
+            stack[sp] = stack[sp - 1]
+            sp += 1
+            pc += 1
+        elif op == SWAP:
+            if sp < 2:
+                break
+            a = stack[sp - 1]
+            stack[sp - 1] = stack[sp - 2]
+            stack[sp - 2] = a
+            pc += 1
+        elif op == LOAD_PUSH_ADD_STORE:
+            a = args[pc]
+            if a < 0 or a >= memory_size:
+                break
+            m = memory[a]
+            b = args[pc + 1]
+            r = m + b
+            if ((m ^ r) & (b ^ r)) < 0:
+                break  # int64 overflow
+            memory[a] = r
+            pc += 2
+        elif op == DUP_JZ:
+            if sp < 1 or sp >= stack_size:
+                break
+            a = stack[sp - 1]
+            stack[sp] = a
+            sp += 1
+            pc = args[pc] if a == 0 else pc + 1
+        elif op == CALL:
+            if csp >= len(call_stack):
+                break
+            call_stack[csp] = pc + 1
+            csp += 1
+            pc = args[pc]
+        elif op == RET:
+            if csp < 1:
+                break
+            csp -= 1
+            pc = call_stack[csp]
+        elif op == HALT:
+            status = EXIT_HALT
+            break
+        else:
+            break  # PRINT and anything else is left to the interpreter
+
+    state[0] = pc
+    state[1] = sp
+    state[2] = csp
+    return status
+
+
+if njit is not None:
+    _run_compiled = njit(cache=True)(_run)
+
+    def run(ops, args, stack, memory, call_stack, state):
+        """Run the compiled kernel on array.array buffers, sharing their memory."""
+        if len(args) != len(ops):
+            raise ValueError("ops and args must have the same length")
+        return _run_compiled(
+            np.frombuffer(ops, dtype=ops.typecode),
+            np.frombuffer(args, dtype=args.typecode),
+            np.frombuffer(stack, dtype=stack.typecode),
+            np.frombuffer(memory, dtype=memory.typecode),
+            np.frombuffer(call_stack, dtype=call_stack.typecode),
+            np.frombuffer(state, dtype=state.typecode),
+        )
+else:
+    run = None
@@ -0,0 +1,14 @@
+"""
+Exit codes shared by the native execution kernels (``_vm`` and ``_jit``).
+
+Kept in a module of their own so the VM can use them without importing
+Numba when the Cython kernel is available.
+"""
+
+EXIT_HALT = 0  # Execution finished
+EXIT_STEP = 1  # The interpreter must execute the instruction at state[0]
+EXIT_YIELD = 2  # The instruction budget ran out; re-enter at state[0]
+
+# Instructions a kernel runs before yielding, so that Python can handle
+# signals such as KeyboardInterrupt while a long program runs
+BUDGET = 1 << 20
@@ -0,0 +1,287 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Cython-compiled execution kernel for the stack-based VM.
+
+This is an ahead-of-time build of the kernel in ``_jit`` for environments
+without Numba. It has the same ``run`` signature and exit protocol, and
+the dispatch loop is a C switch over the opcode values.
+"""
+
+from libc.stdint cimport uint64_t, INT64_MIN
+
+cdef extern from *:
+    # GCC and Clang builtin: stores the wrapped product, returns 1 on overflow
+    bint __builtin_mul_overflow(long long a, long long b, long long *r) nogil
+
+from .opcodes import OpCode
+from ._status import (
+    EXIT_HALT as _EXIT_HALT, EXIT_STEP as _EXIT_STEP, EXIT_YIELD as _EXIT_YIELD, BUDGET,
+)
+
+# OpCode values; checked against the enum at import time
+cdef enum:
+    PUSH = 1
+    POP = 2
+    DUP = 3
+    SWAP = 4
+    ADD = 5
+    SUB = 6
+    MUL = 7
+    DIV = 8
+    EQ = 10
+    NEQ = 11
+    LT = 12
+    GT = 13
+    JMP = 16
+    JZ = 17
+    JNZ = 18
+    CALL = 19
+    RET = 20
+    HALT = 21
+    LOAD = 24
+    STORE = 25
+    AND = 26
+    OR = 27
+    NOT = 28
+    PUSH_ADD = 29
+    LOAD_PUSH_ADD_STORE = 30
+    DUP_JZ = 31
+    PUSH_I = 33
+
+cdef enum:
+    EXIT_HALT = 0
+    EXIT_STEP = 1
+    EXIT_YIELD = 2
+
+_EXPECTED = {
+    'PUSH': PUSH, 'POP': POP, 'DUP': DUP, 'SWAP': SWAP, 'ADD': ADD, 'SUB': SUB,
+    'MUL': MUL, 'DIV': DIV, 'EQ': EQ, 'NEQ': NEQ, 'LT': LT, 'GT': GT, 'JMP': JMP,
+    'JZ': JZ, 'JNZ': JNZ, 'CALL': CALL, 'RET': RET, 'HALT': HALT, 'LOAD': LOAD,
+    'STORE': STORE, 'AND': AND, 'OR': OR, 'NOT': NOT, 'PUSH_ADD': PUSH_ADD,
+    'LOAD_PUSH_ADD_STORE': LOAD_PUSH_ADD_STORE, 'DUP_JZ': DUP_JZ, 'PUSH_I': PUSH_I,
+}
+if (any(OpCode[name].value != value for name, value in _EXPECTED.items())
+        or (_EXIT_HALT, _EXIT_STEP, _EXIT_YIELD) != (EXIT_HALT, EXIT_STEP, EXIT_YIELD)):
+    raise ImportError("stackvm._vm was built against different opcodes; rebuild it")
+
+
+def run(const int[::1] ops, const long long[::1] args, long long[::1] stack,
+        long long[::1] memory, int[::1] call_stack, long long[::1] state):
+    """
+    Execute lowered bytecode until HALT or an instruction that needs the interpreter.
+
+    Args:
+        ops: Opcode value of each instruction (int32)
+        args: Operand of each instruction, 0 if it has none (int64)
+        stack: The VM stack (int64)
+        memory: The VM memory (int64)
+        call_stack: Return addresses (int32)
+        state: [pc, sp, csp], read on entry and written on exit
+
+    Returns:
+        EXIT_HALT, EXIT_STEP, or EXIT_YIELD after BUDGET instructions
+    """
+    cdef Py_ssize_t pc = state[0]
+    cdef Py_ssize_t sp = state[1]
+    cdef Py_ssize_t csp = state[2]
+    cdef Py_ssize_t stack_size = stack.shape[0]
+    cdef Py_ssize_t memory_size = memory.shape[0]
+    cdef Py_ssize_t call_depth = call_stack.shape[0]
+    cdef int op
+    cdef long long a, b, r
+    cdef int status = EXIT_STEP
+    cdef Py_ssize_t budget = BUDGET
+
+    if args.shape[0] != ops.shape[0]:
+        raise ValueError("ops and args must have the same length")
+
+    with nogil:
+        while True:
+            budget -= 1
+            if budget < 0:
+                status = EXIT_YIELD
+                break
+            op = ops[pc]
+
+            if op == PUSH or op == PUSH_I:
+                if sp >= stack_size:
+                    break
+                stack[sp] = args[pc]
+                sp += 1
+                pc += 1
+            elif op == LOAD:
+                a = args[pc]
+                if sp >= stack_size or a < 0 or a >= memory_size:
+                    break
+                stack[sp] = memory[a]
+                sp += 1
+                pc += 1
+            elif op == STORE:
+                a = args[pc]
+                if sp < 1 or a < 0 or a >= memory_size:
+                    break
+                sp -= 1
+                memory[a] = stack[sp]
+                pc += 1
+            elif op == JMP:
+                pc = args[pc]
+            elif op == JZ:
+                if sp < 1:
+                    break
+                pc = args[pc] if stack[sp - 1] == 0 else pc + 1
+            elif op == JNZ:
+                if sp < 1:
+                    break
+                pc = args[pc] if stack[sp - 1] != 0 else pc + 1
+            elif op == ADD:
+                if sp < 2:
+                    break
+                a = stack[sp - 2]
+                b = stack[sp - 1]
+                r = <long long>(<uint64_t>a + <uint64_t>b)
+                if ((a ^ r) & (b ^ r)) < 0:
+                    break  # int64 overflow
+                stack[sp - 2] = r
+                sp -= 1
+                pc += 1
+            elif op == PUSH_ADD:
+                if sp < 1:
+                    break
+                a = stack[sp - 1]
+                b = args[pc]
+                r = <long long>(<uint64_t>a + <uint64_t>b)
+                if ((a ^ r) & (b ^ r)) < 0:
+                    break  # int64 overflow
+                stack[sp - 1] = r
+                pc += 1
+            elif op == SUB:
+                if sp < 2:
+                    break
+                a = stack[sp - 2]
+                b = stack[sp - 1]
+                r = <long long>(<uint64_t>a - <uint64_t>b)
+                if ((a ^ b) & (a ^ r)) < 0:
+                    break  # int64 overflow
+                stack[sp - 2] = r
+                sp -= 1
+                pc += 1
+            elif op == MUL:
+                if sp < 2:
+                    break
+                a = stack[sp - 2]
+                b = stack[sp - 1]
+                if __builtin_mul_overflow(a, b, &r):
+                    break  # int64 overflow
+                stack[sp - 2] = r
+                sp -= 1
+                pc += 1
+            elif op == DIV:
+                if sp < 2:
+                    break
+                a = stack[sp - 2]
+                b = stack[sp - 1]
+                if b == 0 or (a == INT64_MIN and b == -1):
+                    break
+                r = a / b
+                if (a % b != 0) and ((a < 0) != (b < 0)):
+                    r -= 1  # Round towards negative infinity like Python
+                stack[sp - 2] = r
+                sp -= 1
+                pc += 1
+            elif op == EQ:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] == stack[sp - 1]
+                sp -= 1
+                pc += 1
+            elif op == NEQ:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] != stack[sp - 1]
+                sp -= 1
+                pc += 1
+            elif op == LT:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] < stack[sp - 1]
+                sp -= 1
+                pc += 1
+            elif op == GT:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] > stack[sp - 1]
+                sp -= 1
+                pc += 1
+            elif op == AND:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] != 0 and stack[sp - 1] != 0
+                sp -= 1
+                pc += 1
+            elif op == OR:
+                if sp < 2:
+                    break
+                stack[sp - 2] = stack[sp - 2] != 0 or stack[sp - 1] != 0
+                sp -= 1
+                pc += 1
+            elif op == NOT:
+                if sp < 1:
+                    break
+                stack[sp - 1] = stack[sp - 1] == 0
+                pc += 1
+            elif op == POP:
+                if sp < 1:
+                    break
+                sp -= 1
+                pc += 1
+            elif op == DUP:
+                if sp < 1 or sp >= stack_size:
+                    break
+                stack[sp] = stack[sp - 1]
+                sp += 1
+                pc += 1
+            elif op == SWAP:
+                if sp < 2:
+                    break
+                a = stack[sp - 1]
+                stack[sp - 1] = stack[sp - 2]
+                stack[sp - 2] = a
+                pc += 1
+            elif op == LOAD_PUSH_ADD_STORE:
+                a = args[pc]
+                if a < 0 or a >= memory_size:
+                    break
+                b = args[pc + 1]
+                r = <long long>(<uint64_t>memory[a] + <uint64_t>b)
+                if ((memory[a] ^ r) & (b ^ r)) < 0:
+                    break  # int64 overflow
+                memory[a] = r
+                pc += 2
+            elif op == DUP_JZ:
+                if sp < 1 or sp >= stack_size:
+                    break
+                a = stack[sp - 1]
+                stack[sp] = a
+                sp += 1
+                pc = args[pc] if a == 0 else pc + 1
+            elif op == CALL:
+                if csp >= call_depth:
+                    break
+                call_stack[csp] = pc + 1
+                csp += 1
+                pc = args[pc]
+            elif op == RET:
+                if csp < 1:
+                    break
+                csp -= 1
+                pc = call_stack[csp]
+            elif op == HALT:
+                status = EXIT_HALT
+                break
+            else:
+                break  # PRINT and anything else is left to the interpreter
+
+    state[0] = pc
+    state[1] = sp
+    state[2] = csp
+    return status
@@ -1,5 +1,29 @@
+from array import array
 from typing import List, Union, Tuple, Any, Dict, Optional
-from .opcodes import OpCode, OPCODE_MAP
+from .opcodes import (
+    OpCode, OPCODE_MAP, OPCODE_BY_UPPER, OPCODE_BY_VALUE, OPERAND_OPCODES, JUMP_OPCODES,
+)
+
+# Instructions that push their operand
+PUSH_OPCODES = (OpCode.PUSH, OpCode.PUSH_I)
+
+# Opcode values matched by the peephole pass in CodeGenerator._fuse
+_PUSH_VALUES = frozenset(opcode.value for opcode in PUSH_OPCODES)
+_JUMP_VALUES = frozenset(opcode.value for opcode in JUMP_OPCODES)
+_LOAD = OpCode.LOAD.value
+_STORE = OpCode.STORE.value
+_ADD = OpCode.ADD.value
+_DUP = OpCode.DUP.value
+_JZ = OpCode.JZ.value
+_CALL = OpCode.CALL.value
+_PUSH_ADD = OpCode.PUSH_ADD.value
+_LOAD_PUSH_ADD_STORE = OpCode.LOAD_PUSH_ADD_STORE.value
+_DUP_JZ = OpCode.DUP_JZ.value
+_ARG = OpCode.ARG.value
+
+# Range of the operand accepted by PUSH_I
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
 
 class CodeGenerator:
     """
@@ -10,18 +34,40 @@ class CodeGenerator:
     and control structures, making it easier to write programs for the VM.
     """
     
+    __slots__ = ('ops', 'args', 'label_refs', 'labels', 'forward_refs')
+    
     def __init__(self):
         """Initialize the code generator with an empty program."""
-        self.program: List[Union[OpCode, Tuple[OpCode, Any]]] = []
+        # The program is stored as two columns: one opcode byte and one int64
+        # operand (0 if unused) per instruction. Operands that are label names
+        # are kept in label_refs, keyed by instruction index, until generate().
+        # If some other operand does not fit in an int64, args becomes a list.
+        self.ops = bytearray()
+        self.args: Union[array, List[Any]] = array('q')
+        self.label_refs: Dict[int, str] = {}
         self.labels: Dict[str, int] = {}
         self.forward_refs: Dict[str, List[int]] = {}
     
     def reset(self) -> None:
         """Reset the code generator to its initial state."""
-        self.program.clear()
+        self.ops = bytearray()
+        self.args = array('q')
+        self.label_refs.clear()
         self.labels.clear()
         self.forward_refs.clear()
     
+    @property
+    def program(self) -> List[Union[OpCode, Tuple[OpCode, Any]]]:
+        """The instructions emitted so far, with label operands as names."""
+        program = []
+        for i, op in enumerate(self.ops):
+            opcode = OPCODE_BY_VALUE[op]
+            if opcode in OPERAND_OPCODES:
+                program.append((opcode, self.label_refs.get(i, self.args[i])))
+            else:
+                program.append(opcode)
+        return program
+    
     def emit(self, opcode: Union[OpCode, str], operand: Any = None) -> 'CodeGenerator':
         """
         Emit a single instruction to the program.
@@ -32,14 +78,43 @@ class CodeGenerator:
             
         Returns:
             self for method chaining
+            
+        Raises:
+            ValueError: If the operand is missing or not allowed for the
+                opcode, or a PUSH_I operand is not an int64
         """
-        if isinstance(opcode, str):
-            opcode = OPCODE_MAP[opcode.lower()]
+        if type(opcode) is not OpCode:
+            # Names already in upper or lower case need no str.lower() copy
+            name = opcode
+            opcode = OPCODE_BY_UPPER.get(name) or OPCODE_MAP.get(name)
+            if opcode is None:
+                opcode = OPCODE_MAP[name.lower()]
+        
+        if opcode in OPERAND_OPCODES:
+            if operand is None:
+                raise ValueError(f"{opcode.name} requires an operand")
+        elif operand is not None:
+            raise ValueError(f"{opcode.name} takes no operand")
+        
+        if opcode is OpCode.PUSH_I and not (
+                type(operand) is int and INT64_MIN <= operand <= INT64_MAX):
+            raise ValueError(f"PUSH_I operand must be an int64, got {operand!r}")
+        
+        if operand is None:
+            operand = 0
+        elif isinstance(operand, str):
+            self.label_refs[len(self.ops)] = operand
+            operand = 0
         
-        if operand is not None:
-            self.program.append((opcode, operand))
-        else:
-            self.program.append(opcode)
+        self.ops.append(opcode.value)
+        if type(operand) is bool:
+            # The int64 column would store it as an int
+            self.args = list(self.args)
+        try:
+            self.args.append(operand)
+        except (TypeError, OverflowError):
+            self.args = list(self.args)
+            self.args.append(operand)
             
         return self
     
@@ -58,13 +133,13 @@ class CodeGenerator:
             # Update all forward references with the current position
             for addr in self.forward_refs[name]:
                 # Replace the placeholder with the actual address
-                op, _ = self.program[addr]
-                self.program[addr] = (op, len(self.program))
+                self.args[addr] = len(self.ops)
+                self.label_refs.pop(addr, None)
             # Remove the forward reference
             del self.forward_refs[name]
         
         # Record the label's position
-        self.labels[name] = len(self.program)
+        self.labels[name] = len(self.ops)
         return self
     
     def jump(self, target: str) -> 'CodeGenerator':
@@ -136,6 +211,21 @@ class CodeGenerator:
         """
         return self.emit(OpCode.PUSH, value)
     
+    def push_i(self, value: int) -> 'CodeGenerator':
+        """
+        Emit a push of an int64 constant.
+        
+        The operand is range-checked here, when it is emitted; the VM runs
+        PUSH_I exactly like PUSH and does not check it again.
+        
+        Args:
+            value: The integer to push onto the stack
+            
+        Returns:
+            self for method chaining
+        """
+        return self.emit(OpCode.PUSH_I, value)
+    
     def pop(self) -> 'CodeGenerator':
         """
         Emit a pop instruction.
@@ -229,12 +319,20 @@ class CodeGenerator:
         """Emit a halt instruction."""
         return self.emit(OpCode.HALT)
     
-    def generate(self) -> List[Union[OpCode, Tuple[OpCode, Any]]]:
+    def generate(self, optimize: bool = True) -> Tuple[bytearray, Union[array, List[Any]]]:
         """
         Generate the final bytecode with all labels resolved.
         
+        Labels are resolved in place, so without optimization the result
+        is the generator's own opcode and operand columns: live views that
+        change if more instructions are emitted. reset() and assemble()
+        start new columns and leave them alone.
+        
+        Args:
+            optimize: Fuse common instruction sequences into super-instructions
+            
         Returns:
-            The generated bytecode
+            The generated bytecode as parallel (ops, args) columns
             
         Raises:
             ValueError: If there are unresolved forward references
@@ -243,29 +341,89 @@ class CodeGenerator:
         if self.forward_refs:
             raise ValueError(f"Unresolved forward references: {', '.join(self.forward_refs.keys())}")
         
-        # Process the program to resolve labels
-        resolved_program = []
+        # Replace each label reference with its address
+        args = self.args
+        labels = self.labels
+        for i, name in self.label_refs.items():
+            if name not in labels:
+                raise ValueError(f"Unknown label: {name}")
+            args[i] = labels[name]
+        self.label_refs.clear()
         
-        for instruction in self.program:
-            if isinstance(instruction, tuple):
-                opcode, operand = instruction
-                
-                # Check if the operand is a label reference
-                if isinstance(operand, str):
-                    if operand in self.labels:
-                        # Replace label with its address
-                        resolved_program.append((opcode, self.labels[operand]))
-                    else:
-                        # This should not happen if we've processed all forward refs
-                        raise ValueError(f"Unknown label: {operand}")
-                else:
-                    resolved_program.append(instruction)
+        if optimize:
+            return self._fuse(self.ops, args)
+        
+        return self.ops, args
+    
+    def _fuse(self, ops: bytearray, args: Union[array, List[Any]]) -> Tuple[bytearray, Union[array, List[Any]]]:
+        """
+        Peephole pass that fuses common instruction sequences.
+        
+        Each fused sequence is dispatched once by the VM instead of once
+        per instruction. Sequences are never fused across a jump target or
+        a return address, and all jump operands are rewritten to the new
+        instruction positions.
+        
+        Args:
+            ops: Opcode values with all labels resolved
+            args: Operands with all labels resolved
+            
+        Returns:
+            The fused bytecode as new (ops, args) columns
+        """
+        # Positions that control can reach other than by falling through
+        targets = set()
+        for i, op in enumerate(ops):
+            if op in _JUMP_VALUES:
+                targets.add(args[i])
+            if op == _CALL:
+                targets.add(i + 1)
+        
+        # Each window entry is an opcode value or a set of interchangeable values
+        def window(i, *values):
+            if i + len(values) > len(ops):
+                return False
+            for offset, value in enumerate(values):
+                if (ops[i + offset] != value) if type(value) is int else (ops[i + offset] not in value):
+                    return False
+                if offset and i + offset in targets:
+                    return False
+            return True
+        
+        fused_ops = bytearray()
+        fused_args = array('q') if type(args) is array else []
+        new_pc = {}
+        i = 0
+        while i < len(ops):
+            new_pc[i] = len(fused_ops)
+            
+            if window(i, _LOAD, _PUSH_VALUES, _ADD, _STORE) and args[i + 3] == args[i]:
+                fused_ops += bytes((_LOAD_PUSH_ADD_STORE, _ARG))
+                fused_args.append(args[i])
+                fused_args.append(args[i + 1])
+                i += 4
+            elif window(i, _PUSH_VALUES, _ADD):
+                fused_ops.append(_PUSH_ADD)
+                fused_args.append(args[i])
+                i += 2
+            elif window(i, _DUP, _JZ):
+                fused_ops.append(_DUP_JZ)
+                fused_args.append(args[i + 1])
+                i += 2
             else:
-                resolved_program.append(instruction)
+                fused_ops.append(ops[i])
+                fused_args.append(args[i])
+                i += 1
+        new_pc[len(ops)] = len(fused_ops)
         
-        return resolved_program
+        # Rewrite jump targets to the compacted positions
+        for j, op in enumerate(fused_ops):
+            if op in _JUMP_VALUES and fused_args[j] in new_pc:
+                fused_args[j] = new_pc[fused_args[j]]
+        
+        return fused_ops, fused_args
     
-    def assemble(self, source: str) -> List[Union[OpCode, Tuple[OpCode, Any]]]:
+    def assemble(self, source: str) -> Tuple[bytearray, Union[array, List[Any]]]:
         """
         Assemble source code into bytecode.
         
@@ -280,6 +438,10 @@ class CodeGenerator:
         """
         self.reset()
         
+        # Programs repeat the same mnemonics and literals on many lines
+        opcode_cache: Dict[str, OpCode] = {}
+        operand_cache: Dict[str, Union[int, str]] = {}
+        
         # First pass: collect labels
         for line_num, line in enumerate(source.split('\n'), 1):
             line = line.strip()
@@ -291,26 +453,31 @@ class CodeGenerator:
                 label = line[:-1].strip()
                 self.label(label)
             else:
-                # This is an instruction
-                parts = line.split()
-                opcode = parts[0].upper()
+                # This is an instruction: opcode, optional operand, anything else is ignored
+                parts = line.split(None, 2)
+                try:
+                    opcode = opcode_cache[parts[0]]
+                except KeyError:
+                    try:
+                        opcode = opcode_cache[parts[0]] = OPCODE_BY_UPPER[parts[0].upper()]
+                    except KeyError:
+                        raise ValueError(f"Unknown opcode on line {line_num}: {parts[0]}") from None
                 
-                # Handle instructions that take a label as an operand
-                if opcode in ('JMP', 'JZ', 'JNZ', 'CALL') and len(parts) > 1:
-                    # This is a label reference, we'll resolve it later
-                    pass
+                if len(parts) == 1:
+                    self.emit(opcode)
+                    continue
                 
-                # Add the instruction to the program
-                if len(parts) > 1:
-                    # Try to convert the operand to an integer if possible
+                # Integer literals become numbers, anything else is a label reference
+                try:
+                    operand = operand_cache[parts[1]]
+                except KeyError:
+                    operand = parts[1]
                     try:
-                        operand = int(parts[1])
-                        self.emit(opcode, operand)
+                        operand = int(operand)
                     except ValueError:
-                        # If it's not an integer, treat it as a string (label)
-                        self.emit(opcode, parts[1])
-                else:
-                    self.emit(opcode)
+                        pass
+                    operand_cache[parts[1]] = operand
+                self.emit(opcode, operand)
         
         # Second pass: resolve labels and generate bytecode
         return self.generate()
@@ -327,15 +494,19 @@ class CodeGenerator:
         # Create a reverse mapping of addresses to labels
         addr_to_label = {addr: name for name, addr in self.labels.items()}
         
-        for i, instruction in enumerate(self.program):
+        for i, op in enumerate(self.ops):
             # Add label if this address has one
             if i in addr_to_label:
                 result.append(f"{addr_to_label[i]}:")
             
-            if isinstance(instruction, tuple):
-                opcode, operand = instruction
+            opcode = OPCODE_BY_VALUE[op]
+            if opcode in OPERAND_OPCODES:
+                operand = self.label_refs.get(i, self.args[i])
+                if opcode in JUMP_OPCODES:
+                    # Show resolved jump targets by name
+                    operand = addr_to_label.get(operand, operand)
                 result.append(f"  {i:04d}: {opcode.name:<8} {operand}")
             else:
-                result.append(f"  {i:04d}: {instruction.name}")
+                result.append(f"  {i:04d}: {opcode.name}")
         
         return '\n'.join(result)
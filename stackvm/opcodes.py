@@ -44,8 +44,33 @@ class OpCode(Enum):
     OR = auto()      # Logical OR
     NOT = auto()     # Logical NOT
     
+    # Super-instructions (produced by CodeGenerator's peephole pass)
+    PUSH_ADD = auto()             # PUSH k; ADD
+    LOAD_PUSH_ADD_STORE = auto()  # LOAD a; PUSH k; ADD; STORE a (k in the next ARG slot)
+    DUP_JZ = auto()               # DUP; JZ target
+    ARG = auto()                  # Extra operand of the preceding instruction, never executed
+    
+    # Typed variants (operand checked by the code generator)
+    PUSH_I = auto()  # Push an int64 constant
+    
     def __str__(self):
         return self.name
 
 # Map operation names to their corresponding opcodes
 OPCODE_MAP = {opcode.name.lower(): opcode for opcode in OpCode}
+
+# Same mapping keyed by the upper-case names used in assembly source
+OPCODE_BY_UPPER = {opcode.name: opcode for opcode in OpCode}
+
+# Map opcode values back to opcodes
+OPCODE_BY_VALUE = {opcode.value: opcode for opcode in OpCode}
+
+# Instructions that take an operand
+OPERAND_OPCODES = frozenset({
+    OpCode.PUSH, OpCode.PUSH_I, OpCode.LOAD, OpCode.STORE,
+    OpCode.JMP, OpCode.JZ, OpCode.JNZ, OpCode.CALL,
+    OpCode.PUSH_ADD, OpCode.LOAD_PUSH_ADD_STORE, OpCode.DUP_JZ, OpCode.ARG,
+})
+
+# Instructions whose operand is the address of another instruction
+JUMP_OPCODES = frozenset({OpCode.JMP, OpCode.JZ, OpCode.JNZ, OpCode.CALL, OpCode.DUP_JZ})
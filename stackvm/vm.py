@@ -1,5 +1,18 @@
-from typing import List, Any, Tuple, Optional, Dict, Union
-from .opcodes import OpCode
+from array import array
+from typing import List, Any, Tuple, Optional, Dict, Union, Callable
+from .opcodes import OpCode, OPCODE_BY_VALUE, OPERAND_OPCODES, JUMP_OPCODES
+from ._status import EXIT_HALT, EXIT_YIELD
+
+# Prefer the ahead-of-time Cython kernel, then the Numba one (None if neither
+# is available); _jit imports Numba, so it is only loaded when needed
+try:
+    from ._vm import run as _native_run
+except ImportError:
+    from ._jit import run as _native_run
+
+# A pre-decoded instruction handler: takes the operand and the current
+# program counter and returns the program counter of the next instruction.
+Handler = Callable[[Any, int], int]
 
 class VM:
     """
@@ -8,18 +21,72 @@ class VM:
     This VM executes bytecode instructions on a stack. Each operation
     manipulates the stack in some way, making it easy to implement
     and understand.
+    
+    The stack is a preallocated int64 array indexed by ``sp`` (the number
+    of values on the stack) and memory is a fixed-size int64 array whose
+    cells start at 0. If a value that does not fit in an int64 is produced,
+    both are converted to plain lists for the rest of the run. Return
+    addresses go in an int32 array indexed by ``csp`` that starts with
+    ``call_depth`` entries and doubles when full, so recursion depth is
+    only limited by memory.
+    
+    When the Cython extension is built or Numba is installed and every
+    operand is an int64, programs run in a compiled kernel (see ``_vm.pyx``
+    and ``_jit``) that hands single instructions back to the interpreter
+    for I/O, errors and values outside the int64 range.
     """
     
-    def __init__(self, memory_size: int = 1024):
+    __slots__ = (
+        'stack', 'sp', 'stack_size', 'memory', 'memory_size', 'pc', 'running',
+        'jit', 'call_stack', 'csp', 'call_depth', 'handlers', 'int_handlers',
+        'handler_vec', 'int_handler_vec', 'bytecode', 'code', '_zero_mem',
+    )
+    
+    # Values of the opcodes whose operand is used, of those whose operand is
+    # an instruction address and of those whose operand is a memory address
+    _OPERAND_OPCODES = frozenset(opcode.value for opcode in OPERAND_OPCODES)
+    _JUMP_OPCODES = frozenset(opcode.value for opcode in JUMP_OPCODES)
+    _MEMORY_OPCODES = frozenset(opcode.value for opcode in (
+        OpCode.LOAD, OpCode.STORE, OpCode.LOAD_PUSH_ADD_STORE,
+    ))
+    
+    # Values each instruction needs on the stack and its net effect on the
+    # stack depth, by opcode value
+    _STACK_EFFECTS = {opcode.value: effect for opcode, effect in {
+        OpCode.PUSH: (0, 1), OpCode.PUSH_I: (0, 1), OpCode.POP: (1, -1),
+        OpCode.DUP: (1, 1), OpCode.SWAP: (2, 0),
+        OpCode.ADD: (2, -1), OpCode.SUB: (2, -1), OpCode.MUL: (2, -1), OpCode.DIV: (2, -1),
+        OpCode.EQ: (2, -1), OpCode.NEQ: (2, -1), OpCode.LT: (2, -1), OpCode.GT: (2, -1),
+        OpCode.AND: (2, -1), OpCode.OR: (2, -1), OpCode.NOT: (1, 0),
+        OpCode.JMP: (0, 0), OpCode.JZ: (1, 0), OpCode.JNZ: (1, 0),
+        OpCode.CALL: (0, 0), OpCode.RET: (0, 0),
+        OpCode.LOAD: (0, 1), OpCode.STORE: (1, -1),
+        OpCode.PUSH_ADD: (1, 0), OpCode.LOAD_PUSH_ADD_STORE: (0, 0), OpCode.DUP_JZ: (1, 1),
+        OpCode.ARG: (0, 0), OpCode.PRINT: (1, 0), OpCode.HALT: (0, 0),
+    }.items()}
+    
+    def __init__(self, memory_size: int = 1024, stack_size: int = 1024, jit: bool = True,
+                 call_depth: int = 1024):
         """Initialize the VM with empty stack, memory, and program counter."""
-        self.stack: List[Any] = []
-        self.memory: Dict[int, Any] = {}
+        self.stack: Union[array, List[Any]] = array('q', [0]) * stack_size
+        self.sp: int = 0  # Stack pointer
+        self.stack_size = stack_size
+        # All-zero memory image copied into memory on every reset
+        self._zero_mem = array('q', bytes(8 * memory_size))
+        self.memory: Union[array, List[Any]] = array('q', self._zero_mem)
         self.pc: int = 0  # Program counter
         self.running: bool = False
         self.memory_size = memory_size
+        self.jit = jit
         
-        # Store return addresses for function calls
-        self.call_stack: List[int] = []
+        # The program being executed and its pre-decoded form
+        self.bytecode: List[Union[OpCode, Any]] = []
+        self.code: List[Tuple[Handler, Any]] = []
+        
+        # Store return addresses for function calls; csp is the number in use
+        self.call_stack = array('i', [0]) * call_depth
+        self.csp: int = 0
+        self.call_depth = call_depth
         
         # Instruction handlers mapped to opcodes
         self.handlers = {
@@ -47,222 +114,616 @@ class VM:
             OpCode.AND: self._and,
             OpCode.OR: self._or,
             OpCode.NOT: self._not,
+            OpCode.PUSH_ADD: self._push_add,
+            OpCode.LOAD_PUSH_ADD_STORE: self._load_push_add_store,
+            OpCode.DUP_JZ: self._dup_jump_if_zero,
+            OpCode.ARG: self._arg,
+            OpCode.PUSH_I: self._push,
         }
+        
+        # Specialised handlers used while the stack is an int64 array
+        self.int_handlers = dict(self.handlers)
+        self.int_handlers.update({
+            OpCode.EQ: self._eq_i,
+            OpCode.NEQ: self._neq_i,
+            OpCode.LT: self._lt_i,
+            OpCode.GT: self._gt_i,
+            OpCode.AND: self._and_i,
+            OpCode.OR: self._or_i,
+            OpCode.NOT: self._not_i,
+        })
+        
+        # The same tables as lists indexed by opcode value, used by _prepare
+        self.handler_vec = self._vectorize(self.handlers)
+        self.int_handler_vec = self._vectorize(self.int_handlers)
+    
+    @staticmethod
+    def _vectorize(handlers: Dict[OpCode, Handler]) -> List[Optional[Handler]]:
+        """Turn a handler table into a list indexed by opcode value, None where unset."""
+        vec: List[Optional[Handler]] = [None] * (max(opcode.value for opcode in OpCode) + 1)
+        for opcode, handler in handlers.items():
+            vec[opcode.value] = handler
+        return vec
     
     def reset(self) -> None:
         """Reset the VM to its initial state."""
-        self.stack.clear()
-        self.memory.clear()
+        if type(self.stack) is not array:
+            self.stack = array('q', [0]) * self.stack_size
+        self.sp = 0
+        if type(self.memory) is array:
+            self.memory[:] = self._zero_mem
+        else:
+            self.memory = array('q', self._zero_mem)
         self.pc = 0
         self.running = False
-        self.call_stack.clear()
+        self.csp = 0
+    
+    def _grow_stack(self) -> None:
+        """Double the size of the full stack, which may have no slots at all."""
+        stack = self.stack
+        stack.extend(stack[:1] * len(stack) or array('q', [0]))
+    
+    def _normalize(self, bytecode: List[Union[OpCode, Any]]) -> Tuple[List[int], List[Any]]:
+        """
+        Split bytecode into parallel lists of opcode values and operands.
+        
+        Bare opcodes get a None operand, and a HALT is appended so that
+        running off the end of the program stops execution. Jump targets
+        outside the program are redirected to that HALT. Later stages work
+        on these two lists and never inspect instruction shapes again.
+        
+        Bytecode that is already split into (ops, args) columns, as returned
+        by CodeGenerator.generate(), is copied as is.
+        
+        Args:
+            bytecode: List of instructions and their operands, or (ops, args) columns
+            
+        Returns:
+            (ops, args) lists of equal length
+            
+        Raises:
+            RuntimeError: If an instruction is not an OpCode, the (ops, args)
+                columns differ in length, or LOAD_PUSH_ADD_STORE has no ARG slot
+        """
+        if (type(bytecode) is tuple and len(bytecode) == 2
+                and isinstance(bytecode[0], (bytes, bytearray))):
+            ops, args = list(bytecode[0]), list(bytecode[1])
+            if len(ops) != len(args):
+                raise RuntimeError(
+                    f"Bytecode has {len(ops)} opcodes but {len(args)} operands")
+            for op in ops:
+                if op not in OPCODE_BY_VALUE:
+                    raise RuntimeError(f"Unknown opcode: {op}")
+        else:
+            ops = []
+            args = []
+            
+            for instruction in bytecode:
+                if isinstance(instruction, OpCode):
+                    opcode, operand = instruction, None
+                else:
+                    opcode = instruction[0]
+                    operand = instruction[1] if len(instruction) > 1 else None
+                    if not isinstance(opcode, OpCode):
+                        raise RuntimeError(f"Unknown opcode: {opcode}")
+                ops.append(opcode.value)
+                args.append(operand)
+        
+        ops.append(OpCode.HALT.value)
+        args.append(None)
+        
+        # Jumping outside the program ends it, like running off the end. The
+        # increment of LOAD_PUSH_ADD_STORE is the operand of the next slot.
+        end = len(ops) - 1
+        for pc, op in enumerate(ops):
+            if op in self._JUMP_OPCODES and type(args[pc]) is int and not 0 <= args[pc] <= end:
+                args[pc] = end
+            elif op == OpCode.LOAD_PUSH_ADD_STORE.value and ops[pc + 1] != OpCode.ARG.value:
+                raise RuntimeError(f"LOAD_PUSH_ADD_STORE at {pc} is not followed by ARG")
+        
+        return ops, args
+    
+    def _prepare(self, ops: List[int], args: List[Any],
+                 handlers: List[Optional[Handler]], checked: bool) -> List[Tuple[Handler, Any]]:
+        """
+        Pre-decode normalized bytecode into (handler, operand) pairs.
+        
+        Each instruction is resolved to its handler once, so the dispatch
+        loop does no type checks or dictionary lookups.
+        
+        Memory addresses are immediate operands, so they are bounds-checked
+        here; an instruction with an invalid address is bound to a handler
+        that raises when (and only if) it is executed.
+        
+        Handlers do not check for stack underflow. For programs that
+        _verify() could not prove safe, each instruction that pops is bound
+        to a wrapper that checks the stack depth first.
+        
+        Args:
+            ops: Opcode values from _normalize()
+            args: Operands from _normalize()
+            handlers: The handler table to use, indexed by opcode value
+            checked: Whether to check for stack underflow at run time
+            
+        Returns:
+            The pre-decoded program
+            
+        Raises:
+            RuntimeError: If the bytecode contains an opcode the VM does not implement
+        """
+        code: List[Tuple[Handler, Any]] = []
+        guarded: Dict[Handler, Handler] = {}
+        
+        for op, operand in zip(ops, args):
+            handler = handlers[op]
+            if handler is None:
+                raise RuntimeError(f"Unknown opcode: {OpCode(op)}")
+            if checked and self._STACK_EFFECTS[op][0]:
+                if handler not in guarded:
+                    guarded[handler] = self._guard(handler, op)
+                handler = guarded[handler]
+            if op in self._MEMORY_OPCODES and not (
+                    type(operand) is int and 0 <= operand < self.memory_size):
+                handler = self._bad_address
+            code.append((handler, operand))
+        
+        return code
+    
+    def _guard(self, handler: Handler, op: int) -> Handler:
+        """Wrap a handler so that it raises instead of underflowing the stack."""
+        need = self._STACK_EFFECTS[op][0]
+        message = ("Not enough values on stack to swap" if op == OpCode.SWAP.value
+                   else "Stack underflow")
+        
+        def guarded(operand: Any, pc: int) -> int:
+            if self.sp < need:
+                raise RuntimeError(message)
+            return handler(operand, pc)
+        
+        return guarded
+    
+    def _verify(self, ops: List[int], args: List[Any]) -> bool:
+        """
+        Check statically that no instruction can underflow the stack.
+        
+        Every path through the program is followed while tracking the
+        smallest stack depth each instruction can see; RET continues at
+        every return site. If any instruction could see fewer values than
+        it pops, or control could leave the program, the program runs with
+        run-time underflow checks instead.
+        
+        A backward edge that lowers a depth already recorded means a loop
+        whose body pops more than it pushes. Following it would walk the
+        loop once per value on the stack, so the program is rejected at
+        once instead.
+        
+        Args:
+            ops: Opcode values from _normalize()
+            args: Operands from _normalize()
+            
+        Returns:
+            True if no instruction can underflow the stack
+        """
+        effects = self._STACK_EFFECTS
+        end = len(ops)
+        returns = [pc + 1 for pc, op in enumerate(ops) if op == OpCode.CALL.value]
+        branches = (OpCode.JZ.value, OpCode.JNZ.value, OpCode.DUP_JZ.value)
+        
+        depth: List[Optional[int]] = [None] * end
+        depth[0] = 0
+        work = [0]
+        while work:
+            pc = work.pop()
+            op = ops[pc]
+            if op not in effects:
+                return False  # Left for _prepare() to reject
+            need, delta = effects[op]
+            if depth[pc] < need:
+                return False
+            
+            if op in self._JUMP_OPCODES:
+                target = args[pc]
+                if type(target) is not int or not 0 <= target < end:
+                    return False
+                successors = (pc + 1, target) if op in branches else (target,)
+            elif op == OpCode.RET.value:
+                successors = returns
+            elif op == OpCode.HALT.value or op == OpCode.ARG.value:
+                successors = ()
+            elif op == OpCode.LOAD_PUSH_ADD_STORE.value:
+                successors = (pc + 2,)
+            else:
+                successors = (pc + 1,)
+            
+            d = depth[pc] + delta
+            for successor in successors:
+                if successor >= end:
+                    return False
+                if depth[successor] is None:
+                    depth[successor] = d
+                    work.append(successor)
+                elif d < depth[successor]:
+                    if successor <= pc:
+                        return False
+                    depth[successor] = d
+                    work.append(successor)
+        
+        return True
     
     def execute(self, bytecode: List[Union[OpCode, Any]]) -> Any:
         """
         Execute the given bytecode.
         
         Args:
-            bytecode: List of instructions and their operands
+            bytecode: List of instructions and their operands, or (ops, args) columns
             
         Returns:
             The top value on the stack after execution, or None if the stack is empty
         """
         self.reset()
         self.bytecode = bytecode
+        ops, args = self._normalize(bytecode)
+        checked = not self._verify(ops, args)
+        if any(type(operand) is bool for operand in args):
+            # The int64 arrays would store bools as ints, so start on lists
+            self.stack = list(self.stack)
+            self.memory = list(self.memory)
+            self.code = self._prepare(ops, args, self.handler_vec, checked)
+        else:
+            self.code = self._prepare(ops, args, self.int_handler_vec, checked)
         self.running = True
         
-        while self.running and self.pc < len(self.bytecode):
-            instruction = self.bytecode[self.pc]
+        pc = 0
+        if self.jit and _native_run is not None:
+            lowered = self._lower(ops, args)
+            if lowered is not None:
+                pc = self._run_native(*lowered)
+        
+        # The dispatch loop only touches locals; HALT returns a negative pc
+        code = self.code
+        while self.running:
+            try:
+                while pc >= 0:
+                    handler, operand = code[pc]
+                    pc = handler(operand, pc)
+            except (TypeError, OverflowError):
+                # A value did not fit in the int64 stack or memory; handlers
+                # write those before touching any other state, so the
+                # instruction can be retried once they hold arbitrary objects.
+                if type(self.stack) is not array:
+                    raise
+                self.stack = list(self.stack)
+                self.memory = list(self.memory)
+                code = self.code = self._prepare(ops, args, self.handler_vec, checked)
+            except IndexError:
+                if self.sp < len(self.stack):
+                    raise
+                self._grow_stack()
+        
+        return self.stack[self.sp - 1] if self.sp else None
+    
+    def _lower(self, ops: List[int], args: List[Any]) -> Optional[Tuple[array, array]]:
+        """
+        Pack normalized bytecode into typed arrays for the native kernel.
+        
+        Args:
+            ops: Opcode values from _normalize()
+            args: Operands from _normalize()
             
-            if isinstance(instruction, OpCode):
-                # Simple operation with no operand
-                handler = self.handlers.get(instruction)
-                if handler is None:
-                    raise RuntimeError(f"Unknown opcode: {instruction}")
-                handler()
-                self.pc += 1
+        Returns:
+            (ops, args) as int32 and int64 arrays with 0 for unused operands,
+            or None if an operand is not an int64 or a jump target is out of range
+        """
+        lowered = array('q')
+        end = len(ops) - 1  # Address of the trailing HALT
+        
+        for op, operand in zip(ops, args):
+            if op in self._OPERAND_OPCODES:
+                if type(operand) is not int:
+                    return None
+                if op in self._JUMP_OPCODES and not 0 <= operand <= end:
+                    return None
             else:
-                # Operation with operand
-                opcode = instruction[0]
-                operand = instruction[1] if len(instruction) > 1 else None
-                
-                if opcode not in self.handlers:
-                    raise RuntimeError(f"Unknown opcode: {opcode}")
-                    
-                if opcode == OpCode.PUSH:
-                    self._push(operand)
-                elif opcode == OpCode.JMP:
-                    self._jump(operand)
-                    continue  # Don't increment PC, jump sets it
-                elif opcode == OpCode.JZ:
-                    if self._jump_if_zero(operand):
-                        continue  # Jump happened, don't increment PC
-                elif opcode == OpCode.JNZ:
-                    if self._jump_if_not_zero(operand):
-                        continue  # Jump happened, don't increment PC
-                elif opcode == OpCode.CALL:
-                    self._call(operand)
-                    continue  # Don't increment PC, call sets it
-                elif opcode == OpCode.LOAD:
-                    self._load(operand)
-                elif opcode == OpCode.STORE:
-                    self._store(operand)
-                else:
-                    raise RuntimeError(f"Unhandled opcode with operand: {opcode}")
-                
-                self.pc += 1
+                operand = 0
+            
+            try:
+                lowered.append(operand)
+            except OverflowError:
+                return None
         
-        return self.stack[-1] if self.stack else None
+        return array('i', ops), lowered
+    
+    def _run_native(self, ops: array, args: array) -> int:
+        """
+        Run lowered bytecode in the native kernel.
+        
+        The kernel returns control whenever it reaches an instruction it
+        does not handle; that instruction is executed by its interpreter
+        handler and the kernel is re-entered; if the stack is full, it is
+        grown and the instruction retried in the kernel. It also returns
+        after a fixed instruction budget, so signals are handled even in
+        endless loops.
+        
+        Args:
+            ops: Opcode values from _lower()
+            args: Operands from _lower()
+            
+        Returns:
+            The program counter at which the interpreter should continue,
+            negative if the program halted
+        """
+        state = array('q', [0, 0, 0])
+        code = self.code
+        
+        while True:
+            # Hand the interpreter state to the kernel
+            state[1] = self.sp
+            state[2] = self.csp
+            
+            status = _native_run(ops, args, self.stack, self.memory, self.call_stack, state)
+            
+            # And take it back
+            self.sp = state[1]
+            self.csp = state[2]
+            pc = state[0]
+            
+            if status == EXIT_HALT:
+                return self._halt(None, pc)
+            if status == EXIT_YIELD:
+                continue
+            
+            handler, operand = code[pc]
+            try:
+                pc = handler(operand, pc)
+            except IndexError:
+                if self.sp < len(self.stack):
+                    return pc  # Not a full stack; let the interpreter raise it
+                self._grow_stack()
+                continue  # And retry the instruction in the kernel
+            except (TypeError, OverflowError):
+                return pc  # Let the interpreter recover and retry
+            if not self.running or type(self.stack) is not array:
+                return pc
+            state[0] = pc
     
     # Stack operations
-    def _push(self, value: Any) -> None:
+    def _push(self, value: Any, pc: int) -> int:
         """Push a value onto the stack."""
-        self.stack.append(value)
+        self.stack[self.sp] = value
+        self.sp += 1
+        return pc + 1
     
-    def _pop(self) -> Any:
+    def _pop(self, operand: Any, pc: int) -> int:
         """Pop a value from the stack."""
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        return self.stack.pop()
+        self.sp -= 1
+        return pc + 1
     
-    def _dup(self) -> None:
+    def _dup(self, operand: Any, pc: int) -> int:
         """Duplicate the top value on the stack."""
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        self.stack.append(self.stack[-1])
+        sp = self.sp
+        self.stack[sp] = self.stack[sp - 1]
+        self.sp = sp + 1
+        return pc + 1
     
-    def _swap(self) -> None:
+    def _swap(self, operand: Any, pc: int) -> int:
         """Swap the top two values on the stack."""
-        if len(self.stack) < 2:
-            raise RuntimeError("Not enough values on stack to swap")
-        self.stack[-1], self.stack[-2] = self.stack[-2], self.stack[-1]
+        s, sp = self.stack, self.sp
+        s[sp - 1], s[sp - 2] = s[sp - 2], s[sp - 1]
+        return pc + 1
     
     # Arithmetic operations
-    def _add(self) -> None:
+    def _add(self, operand: Any, pc: int) -> int:
         """Add the top two values on the stack."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(a + b)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] + s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
     
-    def _sub(self) -> None:
+    def _sub(self, operand: Any, pc: int) -> int:
         """Subtract the top value from the second value on the stack."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(a - b)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] - s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
     
-    def _mul(self) -> None:
+    def _mul(self, operand: Any, pc: int) -> int:
         """Multiply the top two values on the stack."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(a * b)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] * s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
     
-    def _div(self) -> None:
+    def _div(self, operand: Any, pc: int) -> int:
         """Divide the second value by the top value on the stack."""
-        b = self._pop()
-        a = self._pop()
-        if b == 0:
+        s, sp = self.stack, self.sp
+        if s[sp - 1] == 0:
             raise ZeroDivisionError("Division by zero")
-        self.stack.append(a // b)  # Integer division
+        s[sp - 2] = s[sp - 2] // s[sp - 1]  # Integer division
+        self.sp = sp - 1
+        return pc + 1
     
-    # Comparison operations
-    def _eq(self) -> None:
+    # Comparison operations. These run once the stack is a list, where a
+    # result is visible through PRINT and execute(), so they store the ints
+    # 1 and 0 rather than bools.
+    def _eq(self, operand: Any, pc: int) -> int:
         """Check if the top two values are equal."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a == b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] == s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
-    def _neq(self) -> None:
+    def _neq(self, operand: Any, pc: int) -> int:
         """Check if the top two values are not equal."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a != b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] != s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
-    def _lt(self) -> None:
+    def _lt(self, operand: Any, pc: int) -> int:
         """Check if the second value is less than the top value."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a < b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] < s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
-    def _gt(self) -> None:
+    def _gt(self, operand: Any, pc: int) -> int:
         """Check if the second value is greater than the top value."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a > b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] > s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
     # Logical operations
-    def _and(self) -> None:
+    def _and(self, operand: Any, pc: int) -> int:
         """Logical AND of the top two values on the stack."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a and b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] and s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
-    def _or(self) -> None:
+    def _or(self, operand: Any, pc: int) -> int:
         """Logical OR of the top two values on the stack."""
-        b = self._pop()
-        a = self._pop()
-        self.stack.append(1 if a or b else 0)
+        s, sp = self.stack, self.sp
+        s[sp - 2] = 1 if s[sp - 2] or s[sp - 1] else 0
+        self.sp = sp - 1
+        return pc + 1
     
-    def _not(self) -> None:
+    def _not(self, operand: Any, pc: int) -> int:
         """Logical NOT of the top value on the stack."""
-        a = self._pop()
-        self.stack.append(0 if a else 1)
+        s, sp = self.stack, self.sp
+        s[sp - 1] = 0 if s[sp - 1] else 1
+        return pc + 1
+    
+    # Specialisations for an int64 stack: they store the bool result itself,
+    # which the array narrows to 1 or 0, so they need no conditional expression
+    def _eq_i(self, operand: Any, pc: int) -> int:
+        """Check if the top two values are equal."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] == s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _neq_i(self, operand: Any, pc: int) -> int:
+        """Check if the top two values are not equal."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] != s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _lt_i(self, operand: Any, pc: int) -> int:
+        """Check if the second value is less than the top value."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] < s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _gt_i(self, operand: Any, pc: int) -> int:
+        """Check if the second value is greater than the top value."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] > s[sp - 1]
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _and_i(self, operand: Any, pc: int) -> int:
+        """Logical AND of the top two values on the stack."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] != 0 and s[sp - 1] != 0
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _or_i(self, operand: Any, pc: int) -> int:
+        """Logical OR of the top two values on the stack."""
+        s, sp = self.stack, self.sp
+        s[sp - 2] = s[sp - 2] != 0 or s[sp - 1] != 0
+        self.sp = sp - 1
+        return pc + 1
+    
+    def _not_i(self, operand: Any, pc: int) -> int:
+        """Logical NOT of the top value on the stack."""
+        s, sp = self.stack, self.sp
+        s[sp - 1] = s[sp - 1] == 0
+        return pc + 1
     
     # Control flow
-    def _jump(self, target: int) -> None:
+    def _jump(self, target: int, pc: int) -> int:
         """Jump to the specified instruction."""
-        self.pc = target
+        return target
     
-    def _jump_if_zero(self, target: int) -> bool:
+    def _jump_if_zero(self, target: int, pc: int) -> int:
         """Jump to the specified instruction if the top of the stack is zero."""
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        if self.stack[-1] == 0:
-            self.pc = target
-            return True
-        return False
-    
-    def _jump_if_not_zero(self, target: int) -> bool:
+        return target if self.stack[self.sp - 1] == 0 else pc + 1
+    
+    def _jump_if_not_zero(self, target: int, pc: int) -> int:
         """Jump to the specified instruction if the top of the stack is not zero."""
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        if self.stack[-1] != 0:
-            self.pc = target
-            return True
-        return False
-    
-    def _call(self, target: int) -> None:
+        return target if self.stack[self.sp - 1] != 0 else pc + 1
+    
+    def _call(self, target: int, pc: int) -> int:
         """Call a subroutine at the specified address."""
-        self.call_stack.append(self.pc + 1)  # Save return address (next instruction)
-        self.pc = target
+        csp, call_stack = self.csp, self.call_stack
+        if csp >= len(call_stack):
+            call_stack.extend(array('i', [0]) * (csp or 1))
+        call_stack[csp] = pc + 1  # Save return address (next instruction)
+        self.csp = csp + 1
+        return target
     
-    def _ret(self) -> None:
+    def _ret(self, operand: Any, pc: int) -> int:
         """Return from a subroutine."""
-        if not self.call_stack:
+        csp = self.csp
+        if not csp:
             raise RuntimeError("Call stack underflow")
-        self.pc = self.call_stack.pop()
+        self.csp = csp - 1
+        return self.call_stack[csp - 1]
     
     # Memory operations
-    def _load(self, address: int) -> None:
+    def _load(self, address: int, pc: int) -> int:
         """Load a value from memory onto the stack."""
-        if address < 0 or address >= self.memory_size:
-            raise IndexError(f"Memory address out of bounds: {address}")
-        self.stack.append(self.memory.get(address, 0))
+        self.stack[self.sp] = self.memory[address]
+        self.sp += 1
+        return pc + 1
     
-    def _store(self, address: int) -> None:
+    def _store(self, address: int, pc: int) -> int:
         """Store the top value from the stack into memory."""
-        if address < 0 or address >= self.memory_size:
-            raise IndexError(f"Memory address out of bounds: {address}")
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        self.memory[address] = self._pop()
+        self.memory[address] = self.stack[self.sp - 1]
+        self.sp -= 1
+        return pc + 1
+    
+    def _bad_address(self, address: Any, pc: int) -> int:
+        """Stand-in for a memory instruction whose address is out of bounds."""
+        raise IndexError(f"Memory address out of bounds: {address}")
+    
+    # Super-instructions
+    def _push_add(self, value: Any, pc: int) -> int:
+        """Add a constant to the top value on the stack (PUSH k; ADD)."""
+        s, sp = self.stack, self.sp
+        s[sp - 1] = s[sp - 1] + value
+        return pc + 1
+    
+    def _load_push_add_store(self, address: int, pc: int) -> int:
+        """Add the constant in the following ARG slot to a memory cell (LOAD a; PUSH k; ADD; STORE a)."""
+        memory = self.memory
+        memory[address] = memory[address] + self.code[pc + 1][1]
+        return pc + 2
+    
+    def _dup_jump_if_zero(self, target: int, pc: int) -> int:
+        """Duplicate the top value and jump if it is zero (DUP; JZ target)."""
+        s, sp = self.stack, self.sp
+        value = s[sp - 1]
+        s[sp] = value
+        self.sp = sp + 1
+        return target if value == 0 else pc + 1
+    
+    def _arg(self, operand: Any, pc: int) -> int:
+        """Operand slots belong to the preceding instruction and are never executed."""
+        raise RuntimeError(f"Cannot execute operand slot at {pc}")
     
     # I/O operations
-    def _print(self) -> None:
+    def _print(self, operand: Any, pc: int) -> int:
         """Print the top value on the stack."""
-        if not self.stack:
-            raise RuntimeError("Stack underflow")
-        print(f"Output: {self.stack[-1]}")
+        print(f"Output: {self.stack[self.sp - 1]}")
+        return pc + 1
     
-    def _halt(self) -> None:
-        """Stop execution."""
+    def _halt(self, operand: Any, pc: int) -> int:
+        """Stop execution, recording the final pc and ending the dispatch loop."""
         self.running = False
+        self.pc = pc
+        return -1
@@ -0,0 +1,191 @@
+"""Tests for the code generator, the assembler and the peephole pass."""
+
+import pytest
+
+from stackvm import VM, CodeGenerator, OpCode
+from stackvm.opcodes import OPCODE_BY_VALUE
+
+
+def opcodes(bytecode):
+    """The opcodes of (ops, args) columns."""
+    return [OPCODE_BY_VALUE[op] for op in bytecode[0]]
+
+
+def run(bytecode):
+    return VM(jit=False).execute(bytecode)
+
+
+def test_generate_resolves_labels():
+    gen = CodeGenerator()
+    gen.push(0).jump_if_zero('end').push(1).label('end').halt()
+    ops, args = gen.generate(optimize=False)
+    assert opcodes((ops, args)) == [OpCode.PUSH, OpCode.JZ, OpCode.PUSH, OpCode.HALT]
+    assert args[1] == 3
+
+
+def test_unknown_label():
+    gen = CodeGenerator()
+    gen.jump('nowhere')
+    with pytest.raises(ValueError, match="Unknown label: nowhere"):
+        gen.generate()
+
+
+def test_operand_checks():
+    gen = CodeGenerator()
+    with pytest.raises(ValueError, match="PUSH requires an operand"):
+        gen.emit(OpCode.PUSH)
+    with pytest.raises(ValueError, match="ADD takes no operand"):
+        gen.emit(OpCode.ADD, 1)
+
+
+def test_push_i_operand_check():
+    gen = CodeGenerator()
+    with pytest.raises(ValueError, match="PUSH_I operand must be an int64"):
+        gen.push_i(2 ** 63)
+    with pytest.raises(ValueError, match="PUSH_I operand must be an int64"):
+        gen.emit(OpCode.PUSH_I, 'x')
+    assert run(gen.push_i(-2 ** 63).generate()) == -2 ** 63
+
+
+def test_operands_outside_int64():
+    gen = CodeGenerator()
+    gen.push(2 ** 70).push(1).add()
+    assert run(gen.generate()) == 2 ** 70 + 1
+    assert run(CodeGenerator().push(True).generate()) is True
+
+
+def test_generated_columns_survive_reset():
+    gen = CodeGenerator()
+    gen.push(7).halt()
+    bytecode = gen.generate(optimize=False)
+    gen.assemble("PUSH 100\nPUSH 200\nADD")
+    assert run(bytecode) == 7
+
+
+def test_assemble():
+    source = """
+        ; Sum 1..10
+        PUSH 0
+        STORE 0
+        push 10
+    loop:
+        DUP_JZ end
+        DUP
+        LOAD 0
+        ADD
+        STORE 0
+        PUSH -1
+        ADD
+        JMP loop
+    end:
+        LOAD 0
+    """
+    assert run(CodeGenerator().assemble(source)) == 55
+
+
+def test_assemble_integer_literals():
+    assert run(CodeGenerator().assemble("PUSH 1_000\nPUSH +5\nADD")) == 1005
+
+
+def test_assemble_repeated_operands():
+    # The same operand text parses to the same value on every line it appears
+    source = """
+        PUSH 2
+        PUSH 2
+        ADD
+        JNZ two
+        PUSH 0
+    two:
+        PUSH 2
+        JMP end
+        PUSH 9
+    end:
+        ADD
+    """
+    gen = CodeGenerator()
+    bytecode = gen.assemble(source)
+    assert run(bytecode) == 6
+    assert gen.assemble(source)[1].tolist() == bytecode[1].tolist()
+
+
+def test_assemble_unknown_opcode():
+    with pytest.raises(ValueError, match="Unknown opcode on line 2: FOO"):
+        CodeGenerator().assemble("PUSH 1\nFOO 2")
+
+
+def test_dump():
+    gen = CodeGenerator()
+    gen.label('start').push(1).jump('start')
+    expected = "start:\n  0000: PUSH     1\n  0001: JMP      start"
+    assert gen.dump() == expected
+    gen.generate()
+    assert gen.dump() == expected
+
+
+# Super-instruction fusion
+
+def test_fuses_push_add():
+    gen = CodeGenerator()
+    gen.push(1).push(2).add()
+    bytecode = gen.generate()
+    assert opcodes(bytecode) == [OpCode.PUSH, OpCode.PUSH_ADD]
+    assert run(bytecode) == 3
+
+
+def test_fuses_load_push_add_store():
+    gen = CodeGenerator()
+    gen.push(5).store(3).load(3).push(4).add().store(3).load(3)
+    bytecode = gen.generate()
+    assert opcodes(bytecode) == [OpCode.PUSH, OpCode.STORE, OpCode.LOAD_PUSH_ADD_STORE,
+                                 OpCode.ARG, OpCode.LOAD]
+    assert list(bytecode[1][2:4]) == [3, 4]
+    assert run(bytecode) == 9
+
+
+def test_does_not_fuse_into_other_cells():
+    gen = CodeGenerator()
+    gen.load(3).push(4).add().store(2)
+    assert OpCode.LOAD_PUSH_ADD_STORE not in opcodes(gen.generate())
+
+
+def test_fuses_dup_jz():
+    gen = CodeGenerator()
+    gen.push(0).dup().jump_if_zero('end').push(9).label('end')
+    bytecode = gen.generate()
+    assert opcodes(bytecode) == [OpCode.PUSH, OpCode.DUP_JZ, OpCode.PUSH]
+    assert bytecode[1][1] == 3
+    assert run(bytecode) == 0
+
+
+def test_does_not_fuse_across_jump_target():
+    # 'skip' lands on the ADD, so PUSH 10; ADD must stay separate
+    def build(gen):
+        gen.push(1).push(2).jump('skip').push(10).label('skip').add()
+        return gen
+    bytecode = build(CodeGenerator()).generate()
+    assert OpCode.PUSH_ADD not in opcodes(bytecode)
+    assert run(bytecode) == run(build(CodeGenerator()).generate(optimize=False)) == 3
+
+
+def test_call_return_site_after_fusion():
+    # The return address must point at the fused instruction after CALL
+    def build(gen):
+        (gen.push(1).call('f').push(2).add().halt()
+            .label('f').push(10).add().ret())
+        return gen
+    bytecode = build(CodeGenerator()).generate()
+    assert opcodes(bytecode).count(OpCode.PUSH_ADD) == 2
+    assert run(bytecode) == run(build(CodeGenerator()).generate(optimize=False)) == 13
+
+
+def test_jump_targets_are_remapped():
+    def build(gen):
+        (gen.push(0).store(0).push(5)
+            .label('loop').dup().jump_if_zero('end')
+            .load(0).push(2).add().store(0)
+            .push(-1).add().jump('loop')
+            .label('end').load(0))
+        return gen
+    bytecode = build(CodeGenerator()).generate()
+    assert len(bytecode[0]) < len(build(CodeGenerator()).generate(optimize=False)[0])
+    assert run(bytecode) == 10
@@ -0,0 +1,211 @@
+"""Tests that the native kernels agree with the interpreter."""
+
+import random
+
+import pytest
+
+import stackvm.vm
+from stackvm import VM, CodeGenerator, OpCode
+from stackvm._status import BUDGET
+
+
+def _kernels():
+    kernels = []
+    try:
+        from stackvm._vm import run
+        kernels.append(pytest.param(run, id='cython'))
+    except ImportError:
+        pass
+    from stackvm._jit import run
+    if run is not None:
+        kernels.append(pytest.param(run, id='numba'))
+    return kernels or [pytest.param(None, id='none', marks=pytest.mark.skip("no native kernel"))]
+
+
+@pytest.fixture(params=_kernels())
+def kernel(request, monkeypatch):
+    monkeypatch.setattr(stackvm.vm, '_native_run', request.param)
+    return request.param
+
+
+def outcome(bytecode, jit, capsys):
+    """Everything a run can observably produce."""
+    vm = VM(jit=jit)
+    try:
+        result = vm.execute(bytecode)
+    except Exception as e:
+        result = (type(e).__name__, str(e))
+    cells = [(i, value) for i, value in enumerate(vm.memory) if value]
+    return result, capsys.readouterr().out, list(vm.stack[:vm.sp]), cells
+
+
+def agree(bytecode, capsys):
+    native = outcome(bytecode, True, capsys)
+    assert native == outcome(bytecode, False, capsys)
+    return native
+
+
+INT64_MAX = (1 << 63) - 1
+INT64_MIN = -(1 << 63)
+
+
+@pytest.mark.parametrize('a, b, opcode', [
+    (INT64_MAX, 1, OpCode.ADD),
+    (INT64_MIN, -1, OpCode.ADD),
+    (INT64_MIN, 1, OpCode.SUB),
+    (INT64_MAX, -1, OpCode.SUB),
+    (1 << 32, 1 << 32, OpCode.MUL),
+    (-(1 << 40), 1 << 30, OpCode.MUL),
+    (1 << 40, 1, OpCode.MUL),
+    (-(1 << 31), 1 << 32, OpCode.MUL),
+    (3037000500, 3037000500, OpCode.MUL),
+    (INT64_MIN, -1, OpCode.MUL),
+    (-1, INT64_MIN, OpCode.MUL),
+    (INT64_MIN, 1, OpCode.MUL),
+    (0, INT64_MIN, OpCode.MUL),
+    (INT64_MIN, -1, OpCode.DIV),
+    (-7, 2, OpCode.DIV),
+    (7, -2, OpCode.DIV),
+])
+def test_int64_overflow(kernel, capsys, a, b, opcode):
+    result, *_ = agree([(OpCode.PUSH, a), (OpCode.PUSH, b), opcode], capsys)
+    expected = {OpCode.ADD: a + b, OpCode.SUB: a - b, OpCode.MUL: a * b, OpCode.DIV: a // b}
+    assert result == expected[opcode]
+
+
+def test_super_instruction_overflow(kernel, capsys):
+    gen = CodeGenerator()
+    gen.push(INT64_MAX).store(0).load(0).push(1).add().store(0).load(0).push(INT64_MAX).add()
+    bytecode = gen.generate()
+    assert OpCode.LOAD_PUSH_ADD_STORE.value in bytecode[0]
+    assert OpCode.PUSH_ADD.value in bytecode[0]
+    assert agree(bytecode, capsys)[0] == 2 * INT64_MAX + 1
+
+
+def test_boxing(kernel, capsys):
+    bytecode = [(OpCode.PUSH, 3), (OpCode.STORE, 1), (OpCode.PUSH, 2 ** 62), OpCode.DUP, OpCode.ADD,
+                OpCode.DUP, OpCode.ADD, (OpCode.STORE, 2), (OpCode.LOAD, 1), OpCode.PRINT]
+    result, out, stack, cells = agree(bytecode, capsys)
+    assert cells == [(1, 3), (2, 2 ** 64)]
+    assert out == "Output: 3\n"
+
+
+def test_print_hand_off(kernel, capsys):
+    source = """
+        PUSH 3
+    loop:
+        DUP_JZ end
+        PRINT
+        PUSH -1
+        ADD
+        JMP loop
+    end:
+    """
+    result, out, stack, cells = agree(CodeGenerator().assemble(source), capsys)
+    assert out == "Output: 3\nOutput: 2\nOutput: 1\n"
+
+
+def test_errors_hand_off(kernel, capsys):
+    bytecode = [(OpCode.PUSH, 5), OpCode.PRINT, (OpCode.PUSH, 0), OpCode.DIV]
+    assert agree(bytecode, capsys)[:2] == (("ZeroDivisionError", "Division by zero"), "Output: 5\n")
+    bytecode = [(OpCode.PUSH, 1), OpCode.PRINT, OpCode.POP, OpCode.POP]
+    assert agree(bytecode, capsys)[0] == ("RuntimeError", "Stack underflow")
+
+
+def test_stack_and_call_stack_growth(kernel, capsys):
+    source = """
+        PUSH 2000
+        CALL f
+        HALT
+    f:
+        DUP_JZ done
+        PUSH -1
+        ADD
+        CALL f
+    done:
+        RET
+    """
+    vm = VM(stack_size=8, call_depth=8)
+    bytecode = CodeGenerator().assemble(source)
+    assert vm.execute(bytecode) == 0 and vm.sp == 2002
+    assert VM(jit=False).execute(bytecode) == 0
+
+
+def kernel_entries(kernel, monkeypatch):
+    """Record the pc each time the VM enters the kernel."""
+    entries = []
+    
+    def run(*kernel_args):
+        entries.append(kernel_args[-1][0])
+        return kernel(*kernel_args)
+    
+    monkeypatch.setattr(stackvm.vm, '_native_run', run)
+    return entries
+
+
+def test_exact_products_stay_in_kernel(kernel, monkeypatch):
+    entries = kernel_entries(kernel, monkeypatch)
+    # Products outside the int32 range that still fit in an int64
+    bytecode = [(OpCode.PUSH, 1 << 40), (OpCode.PUSH, 1), OpCode.MUL,
+                (OpCode.PUSH, -(1 << 22)), OpCode.MUL, (OpCode.PUSH, 2), OpCode.MUL]
+    assert VM().execute(bytecode) == INT64_MIN
+    assert entries == [0]
+
+
+def test_full_stack_stays_in_kernel(kernel, monkeypatch, capsys):
+    entries = kernel_entries(kernel, monkeypatch)
+    bytecode = [(OpCode.PUSH, i) for i in range(100)] + [OpCode.PRINT] * 3
+    assert VM(stack_size=4).execute(bytecode) == 99
+    assert capsys.readouterr().out == "Output: 99\n" * 3
+    # Once at the start, after each of the five growths (4 to 128 slots)
+    # and after each PRINT
+    assert entries == [0, 4, 8, 16, 32, 64, 101, 102, 103]
+
+
+def test_runs_past_instruction_budget(kernel):
+    gen = CodeGenerator()
+    n = BUDGET  # Three instructions per iteration
+    gen.push(n).label('loop').push_i(-1).add().jump_if_not_zero('loop')
+    assert VM().execute(gen.generate(optimize=False)) == 0
+
+
+def random_program(r):
+    out = []
+    for _ in range(r.randint(1, 30)):
+        k = r.random()
+        here = len(out)
+        if k < 0.3:
+            out.append((OpCode.PUSH, r.choice([0, 1, -1, 2, 7, -3, 2 ** 40, 2 ** 62, INT64_MIN, 10 ** 30])))
+        elif k < 0.4:
+            out.append((r.choice([OpCode.LOAD, OpCode.STORE]), r.choice([0, 1, 3, 1023, 1024, -1])))
+        elif k < 0.5:
+            # Forward jumps only, so every program terminates
+            out.append((r.choice([OpCode.JMP, OpCode.JZ, OpCode.JNZ]), r.randint(here + 1, here + 8)))
+        elif k < 0.53 and all(not isinstance(i, tuple) or i[0] is not OpCode.CALL for i in out):
+            out.append((OpCode.CALL, r.randint(here + 1, here + 8)))
+        elif k < 0.56:
+            out.append(OpCode.RET)
+        elif k < 0.58:
+            out.append((OpCode.PUSH_I, r.choice([0, 1, -2, INT64_MAX])))
+        elif k < 0.6:
+            out.append((OpCode.PUSH_ADD, r.choice([1, -5, 2 ** 62])))
+        elif k < 0.63:
+            out.append((OpCode.DUP_JZ, r.randint(here + 1, here + 8)))
+        elif k < 0.66:
+            out.append((OpCode.LOAD_PUSH_ADD_STORE, r.choice([0, 1, 1024])))
+            out.append((OpCode.ARG, r.choice([1, 2 ** 62])))
+        else:
+            out.append(r.choice([
+                OpCode.POP, OpCode.DUP, OpCode.SWAP, OpCode.ADD, OpCode.SUB, OpCode.MUL, OpCode.DIV,
+                OpCode.EQ, OpCode.NEQ, OpCode.LT, OpCode.GT, OpCode.AND, OpCode.OR, OpCode.NOT,
+                OpCode.PRINT,
+            ]))
+    return out
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_programs(kernel, capsys, seed):
+    r = random.Random(seed)
+    for _ in range(250):
+        bytecode = random_program(r)
+        assert outcome(bytecode, True, capsys) == outcome(bytecode, False, capsys), bytecode
@@ -0,0 +1,222 @@
+"""Tests for the virtual machine: results, errors and load-time checks."""
+
+import time
+from array import array
+
+import pytest
+
+from stackvm import VM, CodeGenerator, OpCode
+
+
+@pytest.fixture(params=[True, False], ids=['jit', 'interpreter'])
+def vm(request):
+    return VM(jit=request.param)
+
+
+def test_arithmetic(vm):
+    bytecode = [(OpCode.PUSH, 10), (OpCode.PUSH, 20), OpCode.ADD,
+                (OpCode.PUSH, 3), OpCode.MUL, (OpCode.PUSH, 5), OpCode.SUB]
+    assert vm.execute(bytecode) == 85
+
+
+def test_floor_division(vm):
+    assert vm.execute([(OpCode.PUSH, -7), (OpCode.PUSH, 2), OpCode.DIV]) == -4
+
+
+def test_empty_program_returns_none(vm):
+    assert vm.execute([]) is None
+    assert vm.execute(()) is None
+
+
+def test_comparisons_store_ints(vm):
+    bytecode = [(OpCode.PUSH, 1), (OpCode.PUSH, 2), OpCode.LT]
+    result = vm.execute(bytecode)
+    assert result == 1 and type(result) is int
+
+
+def test_print(vm, capsys):
+    vm.execute([(OpCode.PUSH, 42), OpCode.PRINT, OpCode.HALT])
+    assert capsys.readouterr().out == "Output: 42\n"
+
+
+def test_memory_is_cleared_between_runs(vm):
+    vm.execute([(OpCode.PUSH, 5), (OpCode.STORE, 7)])
+    assert vm.memory[7] == 5
+    assert vm.execute([(OpCode.LOAD, 7)]) == 0
+
+
+def test_values_outside_int64(vm):
+    bytecode = [(OpCode.PUSH, 2 ** 70), (OpCode.PUSH, 1), OpCode.ADD, (OpCode.STORE, 0),
+                (OpCode.LOAD, 0)]
+    assert vm.execute(bytecode) == 2 ** 70 + 1
+    # The next run starts again on int64 arrays
+    assert vm.execute([(OpCode.PUSH, 1)]) == 1
+    assert type(vm.stack) is array and type(vm.memory) is array
+
+
+def test_bool_operands(vm, capsys):
+    assert vm.execute([(OpCode.PUSH, True), OpCode.PRINT, (OpCode.STORE, 0), (OpCode.LOAD, 0)]) is True
+    assert capsys.readouterr().out == "Output: True\n"
+
+
+def test_stack_grows(vm):
+    small = VM(stack_size=4, jit=vm.jit)
+    bytecode = [(OpCode.PUSH, i) for i in range(100)]
+    assert small.execute(bytecode) == 99
+    assert small.sp == 100
+    assert VM(stack_size=0, jit=vm.jit).execute(bytecode) == 99
+
+
+def test_deep_recursion_grows_call_stack(vm):
+    source = """
+        PUSH 3000
+        CALL f
+        HALT
+    f:
+        JZ done
+        PUSH -1
+        ADD
+        CALL f
+        PUSH 1
+        ADD
+    done:
+        RET
+    """
+    small = VM(call_depth=4, jit=vm.jit)
+    assert small.execute(CodeGenerator().assemble(source)) == 3000
+
+
+@pytest.mark.parametrize('target', [50, -3])
+def test_jump_outside_program_halts(vm, target):
+    assert vm.execute([(OpCode.PUSH, 7), (OpCode.JMP, target), (OpCode.PUSH, 8)]) == 7
+
+
+@pytest.mark.parametrize('bytecode', [
+    [(OpCode.PUSH, 5), (OpCode.LOAD_PUSH_ADD_STORE, 0)],
+    [(OpCode.LOAD_PUSH_ADD_STORE, 0), (OpCode.PUSH, 1)],
+], ids=['last', 'no-arg'])
+def test_load_push_add_store_needs_arg(vm, bytecode):
+    with pytest.raises(RuntimeError, match="LOAD_PUSH_ADD_STORE at [01] is not followed by ARG"):
+        vm.execute(bytecode)
+
+
+def test_unknown_opcode(vm):
+    with pytest.raises(RuntimeError, match="Unknown opcode: MOD"):
+        vm.execute([(OpCode.PUSH, 1), (OpCode.PUSH, 1), OpCode.MOD])
+    with pytest.raises(RuntimeError, match="Unknown opcode: PUSH"):
+        vm.execute([("PUSH", 1)])
+
+
+def test_columns_must_have_equal_length(vm):
+    with pytest.raises(RuntimeError, match="3 opcodes but 2 operands"):
+        vm.execute((bytearray([1, 1, 2]), array('q', [5, 6])))
+
+
+def test_division_by_zero(vm):
+    with pytest.raises(ZeroDivisionError, match="Division by zero"):
+        vm.execute([(OpCode.PUSH, 1), (OpCode.PUSH, 0), OpCode.DIV])
+
+
+def test_bad_address_only_raises_when_executed(vm):
+    assert vm.execute([(OpCode.PUSH, 1), (OpCode.JMP, 3), (OpCode.LOAD, 5000)]) == 1
+    with pytest.raises(IndexError, match="Memory address out of bounds: 5000"):
+        vm.execute([(OpCode.LOAD, 5000)])
+
+
+def test_call_stack_underflow(vm):
+    with pytest.raises(RuntimeError, match="Call stack underflow"):
+        vm.execute([OpCode.RET])
+
+
+# Stack depth verification
+
+@pytest.mark.parametrize('bytecode', [
+    [(OpCode.PUSH, 1), (OpCode.PUSH, 2), OpCode.ADD, OpCode.PRINT],
+    # A loop whose body leaves the depth unchanged
+    [(OpCode.PUSH, 3), (OpCode.JZ, 5), (OpCode.PUSH, -1), OpCode.ADD, (OpCode.JMP, 1), OpCode.HALT],
+    # A subroutine that consumes the value pushed by its caller
+    [(OpCode.PUSH, 2), (OpCode.CALL, 4), OpCode.PRINT, OpCode.HALT, OpCode.DUP, OpCode.MUL, OpCode.RET],
+], ids=['straight', 'loop', 'call'])
+def test_verify_accepts_safe_programs(bytecode):
+    vm = VM()
+    assert vm._verify(*vm._normalize(bytecode))
+
+
+@pytest.mark.parametrize('bytecode', [
+    [OpCode.POP],
+    [(OpCode.PUSH, 1), OpCode.ADD],
+    # Each iteration pops one more value than it pushes
+    [(OpCode.PUSH, 1), (OpCode.PUSH, 1), OpCode.ADD, (OpCode.JMP, 2)],
+    # The code after the call needs a value the subroutine does not leave
+    [(OpCode.CALL, 3), OpCode.PRINT, OpCode.HALT, OpCode.RET],
+], ids=['pop', 'add', 'loop', 'return-site'])
+def test_verify_rejects_unsafe_programs(bytecode):
+    vm = VM()
+    assert not vm._verify(*vm._normalize(bytecode))
+
+
+def test_verify_rejects_popping_loop_at_once():
+    # Without a bound, each iteration lowers the loop head's depth by one and
+    # the body is walked again, once per value pushed
+    n = 50000
+    body = [OpCode.POP] + [(OpCode.PUSH, 1), OpCode.POP] * 49
+    vm = VM()
+    ops, args = vm._normalize([(OpCode.PUSH, 1)] * n + body + [(OpCode.JMP, n)])
+    start = time.perf_counter()
+    assert not vm._verify(ops, args)
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize('bytecode, message', [
+    ([OpCode.POP], "Stack underflow"),
+    ([(OpCode.PUSH, 1), OpCode.ADD], "Stack underflow"),
+    ([(OpCode.PUSH, 1), OpCode.SWAP], "Not enough values on stack to swap"),
+    ([OpCode.DUP], "Stack underflow"),
+    ([(OpCode.JZ, 0)], "Stack underflow"),
+    ([(OpCode.STORE, 0)], "Stack underflow"),
+    ([OpCode.PRINT], "Stack underflow"),
+    ([(OpCode.PUSH_ADD, 1)], "Stack underflow"),
+], ids=lambda value: value if isinstance(value, str) else None)
+def test_underflow_messages(vm, bytecode, message):
+    with pytest.raises(RuntimeError, match=message):
+        vm.execute(bytecode)
+
+
+def test_unverified_program_runs_when_valid(vm, capsys):
+    # ADD would underflow on the path not taken, so the program cannot be
+    # verified but must still run
+    bytecode = [(OpCode.PUSH, 1), (OpCode.JNZ, 3), OpCode.ADD, OpCode.PRINT]
+    assert not vm._verify(*vm._normalize(bytecode))
+    assert vm.execute(bytecode) == 1
+    assert capsys.readouterr().out == "Output: 1\n"
+
+
+def test_unverified_program_fails_where_it_underflows(vm, capsys):
+    bytecode = [(OpCode.PUSH, 1), OpCode.PRINT, OpCode.POP, OpCode.PRINT]
+    with pytest.raises(RuntimeError, match="Stack underflow"):
+        vm.execute(bytecode)
+    assert capsys.readouterr().out == "Output: 1\n"
+    assert vm.sp == 0
+
+
+def test_verified_program_runs_unchecked_handlers():
+    vm = VM(jit=False)
+    vm.execute([(OpCode.PUSH, 1), (OpCode.PUSH, 2), OpCode.ADD])
+    assert vm.code[2][0] == vm._add
+
+
+def test_unverified_program_runs_checked_handlers():
+    vm = VM(jit=False)
+    vm.execute([(OpCode.PUSH, 1), (OpCode.JNZ, 3), OpCode.ADD])
+    assert vm.code[2][0] != vm._add
+    # Instructions that pop nothing keep their plain handlers
+    assert vm.code[0][0] == vm._push
+
+
+def test_errors_in_verified_program(vm, capsys):
+    bytecode = [(OpCode.PUSH, 6), OpCode.PRINT, (OpCode.PUSH, 0), OpCode.DIV]
+    assert vm._verify(*vm._normalize(bytecode))
+    with pytest.raises(ZeroDivisionError, match="Division by zero"):
+        vm.execute(bytecode)
+    assert capsys.readouterr().out == "Output: 6\n"
+    assert vm.sp == 2